@@ -1,3 +1,15 @@
-from app.main import app
+import os
+
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from app.main import app as fastapi_app
+
+# Vercel's edge proxy sets X-Forwarded-For itself, so the forwarded client
+# address replaces the proxy's in request.client. Restrict the trusted
+# proxies with FORWARDED_ALLOW_IPS when deploying behind anything else.
+app = ProxyHeadersMiddleware(
+    fastapi_app,
+    trusted_hosts=os.environ.get("FORWARDED_ALLOW_IPS", "*"),
+)
 
 # Vercel looks for a variable named 'app' in this file
@@ -1,26 +1,41 @@
 """Solar position calculation endpoints."""
 
+import asyncio
 import logging
 from datetime import date
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import StreamingResponse
-from supabase import Client
-
-from app.core.database import get_supabase
-from app.core.redis_client import check_rate_limit
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+from app.core.database import get_supabase_client
+from app.core.http_cache import cache_headers, is_not_modified, make_etag, not_modified
+from app.core.rate_limiter import DeviceRateLimiter, get_device_rate_limiter
+from app.core.redis_client import (
+    ConcurrencyLimitExceeded,
+    check_rate_limit,
+    concurrent_limit,
+    is_rate_limiting_enabled,
+)
 from app.schemas.sun import (
+    BatchSolarPositionRequest,
+    BatchSolarPositionResponse,
     SolarPositionRequest,
     SolarPositionResponse,
     MeasurementRequest,
     MeasurementResponse,
     StatsResponse,
 )
-from app.services.astronomy import calculate_sun_position
+from app.services.astronomy import (
+    calculate_sun_position,
+    calculate_sun_positions,
+    compute_measurement_geometry,
+)
 from app.services.measurement import (
     MeasurementService,
     MeasurementSaveFailed,
+    RateLimitExceeded,
 )
 
 logger = logging.getLogger(__name__)
@@ -28,18 +43,33 @@ logger = logging.getLogger(__name__)
 # Rate limit TTL in seconds
 RATE_LIMIT_TTL = 10
 
+# Batch calculations run up to MAX_BATCH_POSITIONS Pysolar evaluations:
+# cap how many a single client may have in flight across workers
+BATCH_MAX_IN_FLIGHT = 2
+
 router = APIRouter()
 
 
-def get_measurement_service(
-    supabase: Client = Depends(get_supabase),
-) -> MeasurementService:
-    """Dependency injection for MeasurementService."""
-    return MeasurementService(supabase)
+async def get_measurement_service(request: Request) -> MeasurementService:
+    """
+    Dependency injection for MeasurementService.
+
+    The service is stateless, so one instance is created per app and
+    cached on app.state instead of being rebuilt on every request.
+    """
+    service = getattr(request.app.state, "measurement_service", None)
+    if service is None:
+        service = MeasurementService(await get_supabase_client())
+        request.app.state.measurement_service = service
+    return service
 
 
-@router.post("/calculate", response_model=SolarPositionResponse)
-def calculate_solar_position(request: SolarPositionRequest) -> SolarPositionResponse:
+@router.post(
+    "/calculate",
+    response_model=None,
+    responses={200: {"model": SolarPositionResponse}},
+)
+def calculate_solar_position(request: SolarPositionRequest) -> ORJSONResponse:
     """
     Calculate the sun's position for a given location and time.
 
@@ -54,14 +84,68 @@ def calculate_solar_position(request: SolarPositionRequest) -> SolarPositionResp
         lon=request.longitude,
         dt=request.timestamp,
     )
-    return SolarPositionResponse(**result)
+    # Values come straight from Pysolar: serialize without revalidating
+    position = SolarPositionResponse.model_construct(**result)
+    return ORJSONResponse(position.model_dump(mode="json"))
+
+
+@router.post(
+    "/calculate/batch",
+    response_model=None,
+    responses={200: {"model": BatchSolarPositionResponse}},
+)
+async def calculate_solar_positions(
+    request: BatchSolarPositionRequest,
+    http_request: Request,
+) -> ORJSONResponse:
+    """
+    Calculate the sun's position for many locations/times in one call.
+
+    - **latitudes**: Latitudes in degrees (-90 to 90)
+    - **longitudes**: Longitudes in degrees (-180 to 180)
+    - **timestamps**: Datetimes for each point
+
+    All three arrays must have the same length (max 1440 points, e.g. a
+    full day at 1-minute resolution). Returns azimuths and altitudes in
+    request order.
+
+    Limited to 2 concurrent batch requests per client.
+    """
+    # The server resolves X-Forwarded-For from trusted proxies only
+    # (see api/index.py and run_dev.sh), so this is the caller's address
+    client_host = http_request.client.host if http_request.client else "unknown"
+
+    try:
+        async with concurrent_limit(
+            f"concurrency:calculate_batch:{client_host}",
+            max_in_flight=BATCH_MAX_IN_FLIGHT,
+        ):
+            result = await run_in_threadpool(
+                calculate_sun_positions,
+                request.latitudes,
+                request.longitudes,
+                request.timestamps,
+            )
+    except ConcurrencyLimitExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent batch calculations. Please retry shortly.",
+        )
+
+    positions = BatchSolarPositionResponse.model_construct(**result)
+    return ORJSONResponse(positions.model_dump(mode="json"))
 
 
-@router.post("/measure", response_model=MeasurementResponse)
+@router.post(
+    "/measure",
+    response_model=None,
+    responses={200: {"model": MeasurementResponse}},
+)
 async def save_measurement(
     request: MeasurementRequest,
     service: MeasurementService = Depends(get_measurement_service),
-) -> MeasurementResponse:
+    rate_limiter: DeviceRateLimiter = Depends(get_device_rate_limiter),
+) -> ORJSONResponse:
     """
     Save a measurement comparing device sensor data with calculated sun position.
 
@@ -73,11 +157,37 @@ async def save_measurement(
     Calculates the NASA/Pysolar sun position, computes deltas, and saves to database.
     Returns the full measurement record including the database ID.
 
-    Rate limited to one measurement per device every 10 seconds (via Redis).
+    Rate limited to one measurement per device every 10 seconds
+    (in-process first, then Redis across workers, or the database when
+    Redis is not configured).
     """
-    # Check Redis-based rate limit BEFORE any heavy processing
-    # This prevents spam attacks during slow calculations
-    is_rate_limited = await check_rate_limit(request.device_id, ttl_seconds=RATE_LIMIT_TTL)
+    # Check the in-process limiter BEFORE any heavy processing
+    # This rejects repeat submissions without a network round-trip
+    is_rate_limited = rate_limiter.check_and_stamp(request.device_id) is not None
+    use_redis = is_rate_limiting_enabled()
+    geometry = None
+
+    if not is_rate_limited:
+        # Sun position, sub-solar point and flat Earth height in one
+        # threadpool hop, off the event loop
+        geometry_call = run_in_threadpool(
+            compute_measurement_geometry,
+            request.latitude,
+            request.longitude,
+            request.device_altitude,
+            request.timestamp,
+        )
+        if use_redis:
+            # The Redis check and the geometry have no data dependency:
+            # run the CPU-bound Pysolar call on the threadpool while the Redis
+            # round-trip is in flight, and discard it if the device is blocked
+            is_rate_limited, geometry = await asyncio.gather(
+                check_rate_limit(request.device_id, ttl_seconds=RATE_LIMIT_TTL),
+                geometry_call,
+            )
+        else:
+            geometry = await geometry_call
+
     if is_rate_limited:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -85,17 +195,37 @@ async def save_measurement(
         )
 
     try:
-        # Create measurement (no longer checks rate limit internally)
-        return service.create_measurement_without_rate_check(request)
+        if use_redis:
+            # Redis already opened this device's window
+            measurement = await service.create_measurement_without_rate_check(
+                request, geometry=geometry
+            )
+        else:
+            # No cross-worker limiter: check and insert atomically in the database
+            measurement = await service.insert_measurement_if_allowed(
+                request, geometry=geometry
+            )
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded. Please wait {e.wait_seconds} seconds.",
+        )
     except MeasurementSaveFailed:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save measurement",
         )
 
+    return ORJSONResponse(measurement.model_dump())
 
-@router.get("/measurements", response_model=List[MeasurementResponse])
-def get_measurements(
+
+@router.get(
+    "/measurements",
+    response_model=None,
+    responses={200: {"model": List[MeasurementResponse]}},
+)
+async def get_measurements(
+    http_request: Request,
     target_date: date | None = Query(
         default=None,
         description="Filter measurements by date (YYYY-MM-DD). Defaults to today if not provided.",
@@ -104,7 +234,7 @@ def get_measurements(
         default=5000, ge=1, le=5000, description="Max number of measurements to return"
     ),
     service: MeasurementService = Depends(get_measurement_service),
-) -> List[MeasurementResponse]:
+) -> Response:
     """
     Retrieve measurements for visualization, filtered by date.
 
@@ -112,18 +242,32 @@ def get_measurements(
     - **limit**: Maximum number of measurements to return (default: 5000, max: 5000)
 
     Returns measurements ordered by created_at descending (most recent first).
+    Supports conditional requests via ETag / If-None-Match.
     """
-    return service.get_measurements_by_date(target_date=target_date, limit=limit)
+    filter_date = target_date or date.today()
+    count, latest = await service.get_fingerprint_by_date(target_date=filter_date)
+    etag = make_etag("measurements", filter_date, limit, count, latest)
+    if is_not_modified(http_request, etag):
+        return not_modified(etag)
+
+    # Validated and serialized in one pydantic-core pass, skipping
+    # per-row models and jsonable_encoder
+    content = await service.get_measurements_json_by_date(
+        target_date=filter_date, limit=limit
+    )
+    return Response(content, media_type="application/json", headers=cache_headers(etag))
 
 
 @router.get("/stats", response_model=StatsResponse)
-def get_stats(
+async def get_stats(
+    http_request: Request,
+    response: Response,
     target_date: date | None = Query(
         default=None,
         description="Date to calculate statistics for (YYYY-MM-DD). Defaults to today.",
     ),
     service: MeasurementService = Depends(get_measurement_service),
-) -> StatsResponse:
+) -> StatsResponse | Response:
     """
     Get statistics for measurements on a specific date.
 
@@ -135,12 +279,21 @@ def get_stats(
     - **avg_delta_altitude**: Average altitude delta (device - NASA)
     - **std_dev_azimuth**: Standard deviation of azimuth deltas
     - **std_dev_altitude**: Standard deviation of altitude deltas
+
+    Supports conditional requests via ETag / If-None-Match.
     """
-    return service.get_stats_by_date(target_date=target_date)
+    filter_date = target_date or date.today()
+    count, latest = await service.get_fingerprint_by_date(target_date=filter_date)
+    etag = make_etag("stats", filter_date, count, latest)
+    if is_not_modified(http_request, etag):
+        return not_modified(etag)
+
+    response.headers.update(cache_headers(etag))
+    return await service.get_stats_by_date(target_date=filter_date)
 
 
 @router.get("/export")
-def export_csv(
+async def export_csv(
     target_date: date | None = Query(
         default=None,
         description="Date to export (YYYY-MM-DD). Defaults to today.",
@@ -153,15 +306,14 @@ def export_csv(
     - **target_date**: Date to export (defaults to today)
 
     Returns a downloadable CSV file with all measurements for the specified date.
+    The file is streamed page by page as rows are read from the database.
     """
-    csv_content = service.export_csv_by_date(target_date=target_date)
-
     # Format filename with date
     export_date = target_date or date.today()
     filename = f"helios_data_{export_date}.csv"
 
     return StreamingResponse(
-        iter([csv_content]),
+        service.iter_csv_by_date(target_date=target_date),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
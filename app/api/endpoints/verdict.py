@@ -1,13 +1,15 @@
 """Verdict Engine API endpoints."""
 
+import hmac
 import logging
 import os
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
-from app.core.database import get_supabase
+from app.core.database import get_supabase_client
+from app.core.http_cache import cache_headers, is_not_modified, make_etag, not_modified
+from app.core.redis_client import ConcurrencyLimitExceeded, concurrent_limit
 from app.schemas.verdict import VerdictResponse, TriggerResponse
 from app.services.verdict import VerdictService
 
@@ -17,23 +19,33 @@ router = APIRouter()
 
 # Secret for cron job authentication
 TRIGGER_SECRET = os.getenv("VERDICT_TRIGGER_SECRET", "dev-secret")
+_TRIGGER_SECRET_BYTES = TRIGGER_SECRET.encode()
 
 
-def get_verdict_service(
-    supabase: Client = Depends(get_supabase),
-) -> VerdictService:
-    """Dependency injection for VerdictService."""
-    return VerdictService(supabase)
+async def get_verdict_service(request: Request) -> VerdictService:
+    """
+    Dependency injection for VerdictService.
+
+    The service is stateless, so one instance is created per app and
+    cached on app.state instead of being rebuilt on every request.
+    """
+    service = getattr(request.app.state, "verdict_service", None)
+    if service is None:
+        service = VerdictService(await get_supabase_client())
+        request.app.state.verdict_service = service
+    return service
 
 
 @router.get("/latest", response_model=VerdictResponse)
-def get_latest_verdict(
+async def get_latest_verdict(
+    http_request: Request,
+    response: Response,
     target_date: date | None = Query(
         default=None,
         description="Filter by specific date (YYYY-MM-DD). If not provided, returns the most recent verdict.",
     ),
     service: VerdictService = Depends(get_verdict_service),
-) -> VerdictResponse:
+) -> VerdictResponse | Response:
     """
     Get the most recent verdict, optionally filtered by date.
 
@@ -45,8 +57,10 @@ def get_latest_verdict(
     - **avg_error_azimuth/altitude**: Mean absolute errors in degrees
     - **confidence_score**: 0-100 confidence rating
     - **winning_model**: "NASA" if score > 85, otherwise "ANOMALY"
+
+    Supports conditional requests via ETag / If-None-Match.
     """
-    verdict = service.get_latest(target_date=target_date)
+    verdict = await service.get_latest(target_date=target_date)
 
     if verdict is None:
         if target_date:
@@ -59,11 +73,17 @@ def get_latest_verdict(
             detail="No verdicts found. Trigger a calculation first via POST /trigger.",
         )
 
+    # Recalculating a verdict refreshes its created_at
+    etag = make_etag("verdict", verdict.id, verdict.created_at)
+    if is_not_modified(http_request, etag):
+        return not_modified(etag)
+
+    response.headers.update(cache_headers(etag))
     return verdict
 
 
 @router.post("/trigger", response_model=TriggerResponse)
-def trigger_verdict_calculation(
+async def trigger_verdict_calculation(
     secret: str = Query(..., description="Secret key for cron authentication"),
     target_date: date | None = Query(
         default=None,
@@ -88,20 +108,28 @@ def trigger_verdict_calculation(
     4. Score = 100 - (avg_az + avg_alt), clamped 0-100
     5. Winner: score > 85 => NASA, else ANOMALY
     """
-    if secret != TRIGGER_SECRET:
+    # Constant-time comparison avoids leaking the secret through timing
+    if not hmac.compare_digest(secret.encode(), _TRIGGER_SECRET_BYTES):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid trigger secret",
         )
 
     try:
-        verdict = service.trigger_calculation(target_date=target_date)
+        # One recalculation at a time across workers (overlapping cron runs)
+        async with concurrent_limit("concurrency:verdict_trigger", max_in_flight=1):
+            verdict = await service.trigger_calculation(target_date=target_date)
         date_info = f" for {target_date}" if target_date else ""
         return TriggerResponse(
             success=True,
             verdict=verdict,
             message=f"Verdict calculated{date_info}: {verdict.winning_model} wins with {verdict.confidence_score}% confidence",
         )
+    except ConcurrencyLimitExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A verdict calculation is already running",
+        )
     except Exception as e:
         logger.error(f"Verdict calculation failed: {e}")
         raise HTTPException(
@@ -1,24 +1,130 @@
+import asyncio
 import os
-from supabase import create_client, Client
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-# Supabase configuration from environment variables
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")  # Use the service_role key for server-side
+import httpx
 
-# Create Supabase client (uses REST API over HTTPS)
-supabase: Client | None = None
+if TYPE_CHECKING:
+    # The supabase package pulls in postgrest, auth, storage and realtime
+    # clients; it is imported only when a client is actually created
+    from supabase import AsyncClient
 
-if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Outbound connection pool for Supabase REST calls. One long-lived HTTP/2
+# client keeps TLS connections warm, so only the first request pays the handshake.
+# Sizes are configurable so deployments can keep
+# workers x SUPABASE_MAX_CONNECTIONS under the project's connection ceiling.
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("SUPABASE_TIMEOUT", "30"))
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.environ.get("SUPABASE_MAX_KEEPALIVE", "50")),
+    keepalive_expiry=float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", "60")),
+)
 
+# Async Supabase client (uses REST API over HTTPS).
+# Created lazily by init_supabase() - at startup or on the first request that
+# needs it - and shared by all requests. Nothing connects at import time.
+supabase: "AsyncClient | None" = None
+_http_client: httpx.AsyncClient | None = None
+_init_lock: asyncio.Lock | None = None
 
-def get_supabase() -> Client:
+
+@lru_cache(maxsize=1)
+def get_supabase_credentials() -> tuple[str, str] | None:
     """
-    Dependency that provides the Supabase client.
-    Raises error if not configured.
+    Read Supabase configuration from environment variables on first use.
+
+    Returns:
+        (SUPABASE_URL, SUPABASE_KEY), or None if either is not set.
+        Use the service_role key for server-side access.
+    """
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        return None
+    return url, key
+
+
+async def init_supabase() -> "AsyncClient | None":
+    """
+    Create the shared async Supabase client if it does not exist yet.
+
+    Safe to call from concurrent requests: only the first caller builds
+    the client. Returns None if SUPABASE_URL / SUPABASE_KEY are not configured.
+    """
+    global supabase, _http_client, _init_lock
+
+    if supabase is not None:
+        return supabase
+
+    credentials = get_supabase_credentials()
+    if credentials is None:
+        return None
+
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+
+    async with _init_lock:
+        if supabase is None:
+            from supabase import acreate_client
+            from supabase.lib.client_options import AsyncClientOptions
+
+            url, key = credentials
+            _http_client = httpx.AsyncClient(
+                http2=True,
+                limits=HTTP_LIMITS,
+                timeout=HTTP_TIMEOUT_SECONDS,
+            )
+            supabase = await acreate_client(
+                url,
+                key,
+                options=AsyncClientOptions(httpx_client=_http_client),
+            )
+    return supabase
+
+
+async def close_supabase() -> None:
+    """Close the shared HTTP connection pool. Called when the app shuts down."""
+    global supabase, _http_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    supabase = None
+
+
+def get_supabase() -> "AsyncClient":
+    """
+    Return the Supabase client created by init_supabase().
+    Raises error if it has not been created (e.g. not configured).
     """
     if supabase is None:
         raise RuntimeError(
             "Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY environment variables."
         )
     return supabase
+
+
+async def get_supabase_client() -> "AsyncClient":
+    """
+    Dependency that provides the Supabase client, creating it on first use.
+    Raises error if not configured.
+    """
+    await init_supabase()
+    return get_supabase()
+
+
+def get_backend_status() -> str:
+    """
+    Describe the database backend for health checks, without connecting.
+
+    Returns:
+        "connected" if the client has been created, "configured" if
+        credentials are set but no request has needed it yet, otherwise
+        "not configured"
+    """
+    if supabase is not None:
+        return "connected"
+    if get_supabase_credentials() is not None:
+        return "configured"
+    return "not configured"
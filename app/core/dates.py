@@ -0,0 +1,55 @@
+"""Date and time helpers shared by the service layer."""
+
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from functools import lru_cache
+
+# Time the current request arrived, set by RequestTimeMiddleware
+_request_now: ContextVar[datetime | None] = ContextVar("request_now", default=None)
+
+
+def now_utc() -> datetime:
+    """
+    Return the current UTC time, fixed for the duration of a request.
+
+    Every caller within one request sees the same instant. Outside a
+    request (startup, scripts) this is simply datetime.now(timezone.utc).
+    """
+    now = _request_now.get()
+    return now if now is not None else datetime.now(timezone.utc)
+
+
+class RequestTimeMiddleware:
+    """Pure ASGI middleware that stamps each HTTP request with its arrival time."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_now.set(datetime.now(timezone.utc))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_now.reset(token)
+
+
+@lru_cache(maxsize=64)
+def day_range(day: date) -> tuple[str, str]:
+    """
+    Return the inclusive UTC bounds of a calendar day as ISO 8601 strings.
+
+    Cached because nearly all traffic asks for today or a recent day.
+
+    Args:
+        day: Calendar date
+
+    Returns:
+        Tuple of (start_of_day, end_of_day), e.g.
+        ("2024-06-01T00:00:00Z", "2024-06-01T23:59:59.999999Z")
+    """
+    iso_day = day.isoformat()
+    return f"{iso_day}T00:00:00Z", f"{iso_day}T23:59:59.999999Z"
@@ -0,0 +1,43 @@
+"""HTTP caching helpers (ETag / Cache-Control) for read-only endpoints."""
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+# Freshness policy for dashboard/mobile polling endpoints
+CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+
+
+def make_etag(*parts: object) -> str:
+    """
+    Build a strong ETag from the values that identify a response's content.
+
+    Args:
+        parts: Values that change whenever the response body would change
+
+    Returns:
+        Quoted ETag header value
+    """
+    key = ":".join(str(part) for part in parts)
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    """Return the ETag and Cache-Control headers for a cacheable response."""
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Return True if the request's If-None-Match header matches the ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """Build an empty 304 Not Modified response carrying the cache headers."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
@@ -0,0 +1,76 @@
+"""In-process per-device rate limiter."""
+
+import threading
+import time
+
+
+class DeviceRateLimiter:
+    """
+    Fixed-window rate limiter keyed by device_id, held in process memory.
+
+    Remembers the monotonic time each device was last allowed through, so
+    repeat submissions inside the window are rejected without a network
+    round-trip. State is per process; Redis remains the cross-worker
+    authority (see app.core.redis_client).
+    """
+
+    # Entries older than this many windows are dropped by the periodic sweep
+    SWEEP_AFTER_WINDOWS = 10
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self._last: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + window * self.SWEEP_AFTER_WINDOWS
+
+    def seed(self, device_id: str, seconds_ago: float) -> None:
+        """
+        Record that a device was last allowed `seconds_ago` seconds ago.
+
+        Used to warm-start the limiter from the database at startup and to
+        record database-side rate-limit rejections. Never moves an
+        existing stamp backwards.
+        """
+        stamp = time.monotonic() - max(seconds_ago, 0.0)
+        with self._lock:
+            if stamp > self._last.get(device_id, float("-inf")):
+                self._last[device_id] = stamp
+
+    def check_and_stamp(self, device_id: str) -> float | None:
+        """
+        Check the device against the window and stamp it if allowed.
+
+        Args:
+            device_id: Anonymous device identifier
+
+        Returns:
+            Remaining seconds to wait if the request should be BLOCKED,
+            None if the request is ALLOWED (the device is stamped as now)
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            last = self._last.get(device_id)
+            if last is not None and now - last < self.window:
+                return self.window - (now - last)
+
+            self._last[device_id] = now
+            return None
+
+    def _sweep(self, now: float) -> None:
+        """Drop stale entries. Caller must hold the lock."""
+        max_age = self.window * self.SWEEP_AFTER_WINDOWS
+        self._last = {k: v for k, v in self._last.items() if now - v < max_age}
+        self._next_sweep = now + max_age
+
+
+# Shared per-process limiter for measurement submissions
+device_rate_limiter = DeviceRateLimiter(window=10.0)
+
+
+def get_device_rate_limiter() -> DeviceRateLimiter:
+    """Dependency that provides the shared DeviceRateLimiter."""
+    return device_rate_limiter
@@ -1,8 +1,12 @@
 """Redis client for Upstash-based rate limiting using HTTP driver."""
 
+import hashlib
 import logging
 import os
-from typing import Optional
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
 
 from upstash_redis.asyncio import Redis
 
@@ -10,6 +14,43 @@ logger = logging.getLogger(__name__)
 
 # Global Redis client instance (lazy initialization)
 _redis_client: Optional[Redis] = None
+# Set once the Upstash env vars are found to be missing, so an unconfigured
+# deployment is not re-checked (and re-logged) on every rate-limit call.
+# Client construction errors are not cached: the next call retries.
+_redis_not_configured = False
+
+# Rate-limit decision for any number of keys in one atomic round-trip.
+# Returns the 1-based index of the first key that is still inside its window
+# (BLOCKED), or 0 after opening a fresh window on every key (ALLOWED).
+# Existing keys are never rewritten, so windows do not slide on repeated hits.
+RATE_LIMIT_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        return i
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('SET', key, '1', 'EX', ARGV[1])
+end
+return 0
+"""
+RATE_LIMIT_SCRIPT_SHA = hashlib.sha1(RATE_LIMIT_SCRIPT.encode()).hexdigest()
+
+# Concurrent-request limit on a sorted set of in-flight request ids scored by
+# start time. Entries older than the window are pruned (requests that never
+# released, e.g. a crashed worker). Returns 1 if the limit is reached
+# (BLOCKED), otherwise registers the request and returns 0 (ALLOWED).
+# ARGV: now (epoch seconds), window seconds, max in flight, request id.
+CONCURRENCY_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 1
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 0
+"""
+CONCURRENCY_SCRIPT_SHA = hashlib.sha1(CONCURRENCY_SCRIPT.encode()).hexdigest()
 
 
 def get_redis_client() -> Optional[Redis]:
@@ -17,21 +58,25 @@ def get_redis_client() -> Optional[Redis]:
     Get or create the async Redis client for Upstash (HTTP-based).
 
     Returns:
-        Redis client instance, or None if Upstash credentials are not configured.
+        Redis client instance, or None if Upstash credentials are not configured
+        or the client could not be created (retried on the next call).
 
     Note:
         The client is created lazily on first call and reused thereafter.
+        Creation runs without awaiting, so concurrent coroutines on the event
+        loop cannot interleave here and only one client is ever built.
         Uses Upstash REST API which is ideal for serverless environments.
     """
-    global _redis_client
+    global _redis_client, _redis_not_configured
 
-    if _redis_client is not None:
+    if _redis_client is not None or _redis_not_configured:
         return _redis_client
 
     redis_url = os.getenv("UPSTASH_REDIS_REST_URL")
     redis_token = os.getenv("UPSTASH_REDIS_REST_TOKEN")
 
     if not redis_url or not redis_token:
+        _redis_not_configured = True
         logger.warning(
             "UPSTASH_REDIS_REST_URL or UPSTASH_REDIS_REST_TOKEN not configured - "
             "rate limiting disabled"
@@ -47,6 +92,79 @@ def get_redis_client() -> Optional[Redis]:
         return None
 
 
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a key already has the maximum number of requests in flight."""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"Too many concurrent requests for {key}")
+
+
+def is_rate_limiting_enabled() -> bool:
+    """Return True if Upstash Redis is configured for cross-worker rate limiting."""
+    return get_redis_client() is not None
+
+
+async def _run_script(
+    client: Redis, script: str, sha: str, keys: List[str], args: List
+):
+    """
+    Run a Lua script, sending only its SHA when Redis has it cached.
+
+    Falls back to a full EVAL (which caches the script server-side) on the
+    first call or after the script cache has been flushed.
+    """
+    try:
+        return await client.evalsha(sha, keys=keys, args=args)
+    except Exception as e:
+        if "NOSCRIPT" not in str(e):
+            raise
+    return await client.eval(script, keys=keys, args=args)
+
+
+async def _run_rate_limit_script(
+    client: Redis, keys: List[str], ttl_seconds: int
+) -> int:
+    """Run RATE_LIMIT_SCRIPT for the given keys."""
+    return await _run_script(
+        client, RATE_LIMIT_SCRIPT, RATE_LIMIT_SCRIPT_SHA, keys, [ttl_seconds]
+    )
+
+
+async def check_rate_limits(keys: List[str], ttl_seconds: int = 60) -> Optional[str]:
+    """
+    Check several rate-limit keys (e.g. device, IP, global) in one round-trip.
+
+    Args:
+        keys: Redis keys to check, in priority order
+        ttl_seconds: Time-to-live for each key's window (default: 60s)
+
+    Returns:
+        The first key that BLOCKS the request, or None if it is ALLOWED
+        (in which case a fresh window has been opened on every key)
+
+    Note:
+        Fails open - if Redis is unavailable, requests are allowed.
+    """
+    client = get_redis_client()
+
+    if client is None or not keys:
+        # No Redis configured - allow request
+        return None
+
+    try:
+        blocked_index = await _run_rate_limit_script(client, keys, ttl_seconds)
+    except Exception as e:
+        # Fail open - log error but allow request
+        logger.error(f"Redis error during rate limit check: {e}")
+        return None  # ALLOWED
+
+    if blocked_index:
+        return keys[int(blocked_index) - 1]  # BLOCKED
+
+    return None  # ALLOWED
+
+
 async def check_rate_limit(device_id: str, ttl_seconds: int = 60) -> bool:
     """
     Check if a device is rate-limited using Upstash Redis.
@@ -59,6 +177,32 @@ async def check_rate_limit(device_id: str, ttl_seconds: int = 60) -> bool:
         True if the request should be BLOCKED (rate limited)
         False if the request should be ALLOWED
 
+    Note:
+        Fails open - if Redis is unavailable, requests are allowed.
+    """
+    blocked_key = await check_rate_limits([f"rate_limit:{device_id}"], ttl_seconds)
+    return blocked_key is not None
+
+
+@asynccontextmanager
+async def concurrent_limit(
+    key: str, max_in_flight: int, window_seconds: int = 60
+) -> AsyncIterator[None]:
+    """
+    Limit how many requests for a key may run at the same time, across workers.
+
+    Usage:
+        async with concurrent_limit(f"concurrency:{client_ip}", max_in_flight=2):
+            ...
+
+    Args:
+        key: Redis sorted-set key identifying the caller or resource
+        max_in_flight: Maximum simultaneous requests allowed for the key
+        window_seconds: Age after which an unreleased slot is considered stale
+
+    Raises:
+        ConcurrencyLimitExceeded: If the key already has max_in_flight requests
+
     Note:
         Fails open - if Redis is unavailable, requests are allowed.
     """
@@ -66,23 +210,32 @@ async def check_rate_limit(device_id: str, ttl_seconds: int = 60) -> bool:
 
     if client is None:
         # No Redis configured - allow request
-        return False
-
-    key = f"rate_limit:{device_id}"
+        yield
+        return
 
+    request_id = uuid.uuid4().hex
     try:
-        # Check if key exists (device is rate-limited)
-        existing = await client.get(key)
-        if existing is not None:
-            return True  # BLOCKED
-
-        # Not rate-limited - set the key with expiration BEFORE processing
-        # This prevents spam attacks during slow calculations
-        # Upstash uses: set(key, value, ex=seconds) syntax
-        await client.set(key, "1", ex=ttl_seconds)
-        return False  # ALLOWED
-
+        blocked = await _run_script(
+            client,
+            CONCURRENCY_SCRIPT,
+            CONCURRENCY_SCRIPT_SHA,
+            [key],
+            [time.time(), window_seconds, max_in_flight, request_id],
+        )
     except Exception as e:
         # Fail open - log error but allow request
-        logger.error(f"Redis error during rate limit check: {e}")
-        return False  # ALLOWED
+        logger.error(f"Redis error during concurrency check: {e}")
+        yield
+        return
+
+    if blocked:
+        raise ConcurrencyLimitExceeded(key)
+
+    try:
+        yield
+    finally:
+        try:
+            await client.zrem(key, request_id)
+        except Exception as e:
+            # The slot ages out after window_seconds
+            logger.error(f"Redis error releasing concurrency slot: {e}")
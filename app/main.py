@@ -1,16 +1,60 @@
 """Project Helios API - FastAPI application entry point."""
 
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.api.endpoints import solar, verdict
 from app.core.config import APP_NAME, APP_VERSION, API_V1_PREFIX
-from app.core.database import supabase
+from app.core import database
+from app.core.dates import RequestTimeMiddleware
+from app.services.astronomy import calculate_sun_position, sun_position_cache_info
+from app.services.measurement import MeasurementService
+from app.services.verdict import VerdictService
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared clients and warm caches once per process; close them on exit."""
+    client = await database.init_supabase()
+
+    # Absorb Pysolar's first-call cost here instead of in a user request
+    await run_in_threadpool(calculate_sun_position, 0.0, 0.0)
+
+    if client is not None:
+        # Both services share the client, so both are rebuilt with it
+        app.state.verdict_service = VerdictService(client)
+        service = MeasurementService(client)
+        app.state.measurement_service = service
+        try:
+            # Opens the first keep-alive connection and preloads the rate limiter
+            seeded = await service.seed_recent_rate_limits()
+            logger.info(f"Startup warm-up complete ({seeded} recent measurements)")
+        except Exception as e:
+            logger.warning(f"Startup warm-up failed: {e}")
+
+    yield
+
+    # Drop services bound to the client before its connection pool closes
+    app.state.measurement_service = None
+    app.state.verdict_service = None
+    await database.close_supabase()
+
 
 app = FastAPI(
     title=APP_NAME,
     version=APP_VERSION,
     description="Backend API for Project Helios - Solar position calculations",
+    lifespan=lifespan,
+    # Serialize every JSON response with orjson instead of the stdlib encoder
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware - allow all origins for development
@@ -22,6 +66,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Gzip responses over 1 KB - large JSON lists (e.g. /measurements) are
+# mostly repeated keys and compress roughly tenfold
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# One "now" per request, shared by every helper via app.core.dates.now_utc()
+app.add_middleware(RequestTimeMiddleware)
+
 # Include routers
 app.include_router(
     solar.router,
@@ -44,10 +95,10 @@ def root():
 
 @app.get("/health")
 def health_check():
-    """Detailed health check including database status."""
-    db_status = "connected" if supabase is not None else "not configured"
+    """Detailed health check including database and cache status."""
     return {
         "status": "healthy",
-        "database": db_status,
+        "database": database.get_backend_status(),
         "version": APP_VERSION,
+        "sun_position_cache": sun_position_cache_info(),
     }
@@ -2,7 +2,10 @@
 
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+# Maximum points per batch calculation (one day at 1-minute resolution)
+MAX_BATCH_POSITIONS = 1440
 
 
 class SolarPositionRequest(BaseModel):
@@ -24,6 +27,50 @@ class SolarPositionResponse(BaseModel):
     timestamp: datetime = Field(..., description="Timestamp used for calculation (UTC)")
 
 
+class BatchSolarPositionRequest(BaseModel):
+    """Request model for calculating many solar positions in one call."""
+
+    latitudes: list[float] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_POSITIONS,
+        description="Latitudes in degrees (-90 to 90)",
+    )
+    longitudes: list[float] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_POSITIONS,
+        description="Longitudes in degrees (-180 to 180)",
+    )
+    timestamps: list[datetime] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_POSITIONS,
+        description="Timestamps for calculation (naive values are treated as UTC)",
+    )
+
+    @model_validator(mode="after")
+    def check_points(self) -> "BatchSolarPositionRequest":
+        """Require equal-length arrays and in-range coordinates."""
+        if not len(self.latitudes) == len(self.longitudes) == len(self.timestamps):
+            raise ValueError("latitudes, longitudes and timestamps must have the same length")
+        if any(not -90 <= lat <= 90 for lat in self.latitudes):
+            raise ValueError("latitudes must be between -90 and 90")
+        if any(not -180 <= lon <= 180 for lon in self.longitudes):
+            raise ValueError("longitudes must be between -180 and 180")
+        return self
+
+
+class BatchSolarPositionResponse(BaseModel):
+    """Response model with solar positions, in request order."""
+
+    azimuths: list[float] = Field(..., description="Sun azimuths in degrees (0-360, North = 0)")
+    altitudes: list[float] = Field(
+        ..., description="Sun altitudes in degrees (-90 to 90, horizon = 0)"
+    )
+    timestamps: list[datetime] = Field(..., description="Timestamps used for calculation (UTC)")
+
+
 class MeasurementRequest(BaseModel):
     """Request model for saving a measurement with device sensor data."""
 
@@ -2,7 +2,11 @@
 
 import math
 from datetime import datetime, timezone
-from pysolar.solar import get_altitude, get_azimuth
+from functools import lru_cache
+
+from pysolar.solar import get_position
+
+from app.core.dates import now_utc
 
 # Earth radius in km (for Haversine calculation)
 EARTH_RADIUS_KM = 6371.0
@@ -10,6 +14,35 @@ EARTH_RADIUS_KM = 6371.0
 # Minimum altitude to calculate flat earth height (avoid tan(0) issues)
 MIN_ALTITUDE_FOR_FLAT_EARTH = 5.0
 
+# Sun position cache: keys are rounded to 4 decimal places (~11 m) and whole seconds
+SUN_POSITION_CACHE_SIZE = 4096
+SUN_POSITION_COORD_DECIMALS = 4
+
+# Sub-solar point cache: keys are whole UTC seconds
+SUBSOLAR_POINT_CACHE_SIZE = 4096
+
+
+def _as_utc(dt: datetime) -> datetime:
+    """Return dt in UTC, treating naive datetimes as UTC (as Pysolar expects)."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+@lru_cache(maxsize=SUN_POSITION_CACHE_SIZE)
+def _sun_position_cached(lat: float, lon: float, epoch_seconds: int) -> tuple[float, float]:
+    """Compute (altitude, azimuth) with Pysolar for a rounded cache key."""
+    dt = datetime.fromtimestamp(epoch_seconds, tz=timezone.utc)
+    # get_position evaluates the ephemeris once for both angles; separate
+    # get_altitude/get_azimuth calls would each repeat the full computation
+    azimuth, altitude = get_position(lat, lon, dt)
+    return altitude, azimuth
+
+
+def sun_position_cache_info() -> dict:
+    """Return hit/miss statistics for the sun position cache."""
+    return _sun_position_cached.cache_info()._asdict()
+
 
 def calculate_sun_position(
     lat: float,
@@ -22,23 +55,25 @@ def calculate_sun_position(
     Args:
         lat: Latitude in degrees (-90 to 90)
         lon: Longitude in degrees (-180 to 180)
-        dt: Datetime for calculation (defaults to current UTC time)
+        dt: Datetime for calculation (defaults to the current request's
+            UTC time)
 
     Returns:
         Dictionary with altitude, azimuth, and timestamp
+
+    Note:
+        Results are cached per location rounded to 4 decimal places and
+        per whole second, so repeated and clustered requests skip Pysolar.
     """
     # Ensure UTC timezone for Pysolar
-    if dt is None:
-        dt = datetime.now(timezone.utc)
-    elif dt.tzinfo is None:
-        # Naive datetime - assume UTC
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        # Convert to UTC
-        dt = dt.astimezone(timezone.utc)
-
-    altitude = get_altitude(lat, lon, dt)
-    azimuth = get_azimuth(lat, lon, dt)
+    dt = now_utc() if dt is None else _as_utc(dt)
+
+    altitude, azimuth = _sun_position_cached(
+        round(lat, SUN_POSITION_COORD_DECIMALS),
+        round(lon, SUN_POSITION_COORD_DECIMALS),
+        # Floor rather than truncate so pre-1970 datetimes keep their second
+        math.floor(dt.timestamp()),
+    )
 
     return {
         "altitude": altitude,
@@ -47,24 +82,49 @@ def calculate_sun_position(
     }
 
 
-def calculate_subsolar_point(dt: datetime | None = None) -> tuple[float, float]:
+def calculate_sun_positions(
+    lats: list[float],
+    lons: list[float],
+    dts: list[datetime],
+) -> dict:
     """
-    Calculate the sub-solar point (where the sun is directly overhead).
-
-    Uses solar declination for latitude and solar hour angle for longitude.
+    Calculate the sun's position for many (location, time) points.
 
     Args:
-        dt: Datetime for calculation (defaults to current UTC time)
+        lats: Latitudes in degrees
+        lons: Longitudes in degrees
+        dts: Datetimes for calculation
 
     Returns:
-        Tuple of (latitude, longitude) of sub-solar point
+        Dictionary with altitudes, azimuths, and timestamps lists, in input order
+
+    Note:
+        Batch points bypass the sun position cache: a single batch holds up
+        to MAX_BATCH_POSITIONS one-off keys, which would evict the entries
+        shared by /measure and /calculate.
     """
-    if dt is None:
-        dt = datetime.now(timezone.utc)
-    elif dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        dt = dt.astimezone(timezone.utc)
+    altitudes = []
+    azimuths = []
+    timestamps = []
+
+    for lat, lon, dt in zip(lats, lons, dts):
+        dt = _as_utc(dt)
+        azimuth, altitude = get_position(lat, lon, dt)
+        altitudes.append(altitude)
+        azimuths.append(azimuth)
+        timestamps.append(dt)
+
+    return {
+        "altitudes": altitudes,
+        "azimuths": azimuths,
+        "timestamps": timestamps,
+    }
+
+
+@lru_cache(maxsize=SUBSOLAR_POINT_CACHE_SIZE)
+def _subsolar_point_cached(epoch_seconds: int) -> tuple[float, float]:
+    """Compute the sub-solar point for a whole UTC second."""
+    dt = datetime.fromtimestamp(epoch_seconds, tz=timezone.utc)
 
     # Day of year (1-366)
     day_of_year = dt.timetuple().tm_yday
@@ -88,6 +148,28 @@ def calculate_subsolar_point(dt: datetime | None = None) -> tuple[float, float]:
     return (declination, subsolar_longitude)
 
 
+def calculate_subsolar_point(dt: datetime | None = None) -> tuple[float, float]:
+    """
+    Calculate the sub-solar point (where the sun is directly overhead).
+
+    Uses solar declination for latitude and solar hour angle for longitude.
+
+    Args:
+        dt: Datetime for calculation (defaults to current UTC time)
+
+    Returns:
+        Tuple of (latitude, longitude) of sub-solar point
+
+    Note:
+        The result only depends on the whole UTC second, so it is cached
+        per second and shared by every request in that second.
+    """
+    dt = now_utc() if dt is None else _as_utc(dt)
+
+    # Floor rather than truncate so pre-1970 datetimes keep their second
+    return _subsolar_point_cached(math.floor(dt.timestamp()))
+
+
 def haversine_distance_km(
     lat1: float, lon1: float, lat2: float, lon2: float
 ) -> float:
@@ -153,6 +235,19 @@ def calculate_flat_earth_sun_height(
     # Find the sub-solar point
     subsolar_lat, subsolar_lon = calculate_subsolar_point(dt)
 
+    return _flat_earth_height_from_subsolar(
+        user_lat, user_lon, device_altitude, subsolar_lat, subsolar_lon
+    )
+
+
+def _flat_earth_height_from_subsolar(
+    user_lat: float,
+    user_lon: float,
+    device_altitude: float,
+    subsolar_lat: float,
+    subsolar_lon: float,
+) -> float:
+    """Triangulate the flat Earth sun height from a known sub-solar point."""
     # Calculate surface distance from user to sub-solar point
     distance_km = haversine_distance_km(
         user_lat, user_lon, subsolar_lat, subsolar_lon
@@ -164,3 +259,42 @@ def calculate_flat_earth_sun_height(
     sun_height_km = distance_km * math.tan(altitude_radians)
 
     return sun_height_km
+
+
+def compute_measurement_geometry(
+    lat: float,
+    lon: float,
+    device_altitude: float,
+    dt: datetime | None = None,
+) -> dict:
+    """
+    Compute every derived astronomical value a measurement needs in one call.
+
+    The time is normalized once and shared by the sun position, the
+    sub-solar point and the flat Earth triangulation.
+
+    Args:
+        lat: Latitude in degrees (-90 to 90)
+        lon: Longitude in degrees (-180 to 180)
+        device_altitude: Observed sun altitude angle in degrees
+        dt: Datetime for calculation (defaults to current UTC time)
+
+    Returns:
+        Dictionary with altitude, azimuth and timestamp (as returned by
+        calculate_sun_position), subsolar_lat, subsolar_lon, and
+        flat_earth_height (None if the observed altitude is too low)
+    """
+    geometry = calculate_sun_position(lat, lon, dt)
+
+    subsolar_lat, subsolar_lon = calculate_subsolar_point(geometry["timestamp"])
+    geometry["subsolar_lat"] = subsolar_lat
+    geometry["subsolar_lon"] = subsolar_lon
+
+    geometry["flat_earth_height"] = None
+    if device_altitude >= MIN_ALTITUDE_FOR_FLAT_EARTH:
+        geometry["flat_earth_height"] = _flat_earth_height_from_subsolar(
+            lat, lon, device_altitude, subsolar_lat, subsolar_lon
+        )
+
+    return geometry
+
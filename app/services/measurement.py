@@ -2,17 +2,19 @@
 
 import csv
 import io
-import statistics
-from datetime import date, datetime, timezone
-from typing import List
+from operator import itemgetter
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, AsyncIterator, List
 
-from supabase import Client
+from pydantic import TypeAdapter
 
+from app.core.dates import day_range
+from app.core.rate_limiter import DeviceRateLimiter, device_rate_limiter
 from app.schemas.sun import MeasurementRequest, MeasurementResponse, StatsResponse
-from app.services.astronomy import (
-    calculate_sun_position,
-    calculate_flat_earth_sun_height,
-)
+from app.services.astronomy import compute_measurement_geometry
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
 
 class RateLimitExceeded(Exception):
@@ -29,25 +31,44 @@ class MeasurementSaveFailed(Exception):
     pass
 
 
+# Columns returned to clients, in MeasurementResponse field order
+_MEASUREMENT_COLUMNS = (
+    "id",
+    "created_at",
+    "device_id",
+    "latitude",
+    "longitude",
+    "device_azimuth",
+    "device_altitude",
+    "magnetic_azimuth",
+    "magnetic_declination",
+    "collection_method",
+    "nasa_azimuth",
+    "nasa_altitude",
+    "delta_azimuth",
+    "delta_altitude",
+    "flat_earth_sun_height_km",
+)
+_MEASUREMENT_SELECT = ", ".join(_MEASUREMENT_COLUMNS)
+
+# Pulls a row's values in column order with one C-level call
+_measurement_values = itemgetter(*_MEASUREMENT_COLUMNS)
+
+# Validates and serializes a whole page of rows in one pydantic-core call.
+# Produces the same JSON as a List[MeasurementResponse] response_model
+# (integer-valued REAL columns come out as floats) without a Python-level
+# model per row.
+_measurement_list_adapter = TypeAdapter(List[MeasurementResponse])
+
+
 def _row_to_response(row: dict) -> MeasurementResponse:
-    """Convert a database row to a MeasurementResponse."""
-    return MeasurementResponse(
-        id=row["id"],
-        created_at=row["created_at"],
-        device_id=row.get("device_id"),
-        latitude=row["latitude"],
-        longitude=row["longitude"],
-        device_azimuth=row["device_azimuth"],
-        device_altitude=row["device_altitude"],
-        magnetic_azimuth=row.get("magnetic_azimuth"),
-        magnetic_declination=row.get("magnetic_declination"),
-        collection_method=row.get("collection_method"),
-        nasa_azimuth=row["nasa_azimuth"],
-        nasa_altitude=row["nasa_altitude"],
-        delta_azimuth=row["delta_azimuth"],
-        delta_altitude=row["delta_altitude"],
-        flat_earth_sun_height_km=row.get("flat_earth_sun_height_km"),
-    )
+    """
+    Convert a database row to a MeasurementResponse.
+
+    The row is validated so whole-valued REAL columns, which PostgREST
+    returns as JSON integers, serialize as floats like the rest of the API.
+    """
+    return MeasurementResponse.model_validate(row)
 
 
 class MeasurementService:
@@ -60,48 +81,69 @@ class MeasurementService:
     # Rate limit: minimum seconds between measurements per device
     RATE_LIMIT_SECONDS = 10
 
-    def __init__(self, supabase: Client):
+    # Rows fetched per request when streaming the CSV export
+    EXPORT_PAGE_SIZE = 1000
+
+    def __init__(
+        self,
+        supabase: "AsyncClient",
+        rate_limiter: DeviceRateLimiter | None = None,
+    ):
         self.supabase = supabase
+        self.rate_limiter = rate_limiter if rate_limiter is not None else device_rate_limiter
 
-    def check_rate_limit(self, device_id: str) -> None:
+    async def seed_recent_rate_limits(self, max_rows: int = 1000) -> int:
         """
-        Check if the device is within rate limits.
+        Preload the rate limiter with devices still inside their window.
+
+        Called at startup; this is the limiter's only warm-start from the
+        database. Devices it does not cover are stamped on their first
+        request and checked authoritatively by Redis or by
+        create_measurement_if_allowed. Also opens the first keep-alive
+        connection.
 
         Args:
-            device_id: Anonymous device identifier
+            max_rows: Maximum number of recent measurements to read
 
-        Raises:
-            RateLimitExceeded: If the device has made a measurement too recently
+        Returns:
+            Number of measurements used to seed the limiter
         """
         now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.RATE_LIMIT_SECONDS)
 
-        response = (
+        response = await (
             self.supabase.table("measurements")
-            .select("created_at")
-            .eq("device_id", device_id)
+            .select("device_id, created_at")
+            .gte("created_at", cutoff.isoformat())
             .order("created_at", desc=True)
-            .limit(1)
+            .limit(max_rows)
             .execute()
         )
 
-        if response.data:
-            last_time_str = response.data[0]["created_at"]
-            # Parse ISO format timestamp from Supabase
-            last_time = datetime.fromisoformat(last_time_str.replace("Z", "+00:00"))
-            time_diff = (now - last_time).total_seconds()
+        rows = [row for row in response.data if row.get("device_id")]
+        # Measure ages after the round-trip: seed() anchors them to now
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            last_time = datetime.fromisoformat(row["created_at"])
+            self.rate_limiter.seed(row["device_id"], (now - last_time).total_seconds())
 
-            if time_diff < self.RATE_LIMIT_SECONDS:
-                wait_seconds = int(self.RATE_LIMIT_SECONDS - time_diff)
-                raise RateLimitExceeded(wait_seconds)
+        return len(rows)
 
-    def create_measurement(self, request: MeasurementRequest) -> MeasurementResponse:
+    async def insert_measurement_if_allowed(
+        self,
+        request: MeasurementRequest,
+        geometry: dict | None = None,
+    ) -> MeasurementResponse:
         """
-        Create a new measurement with SQL-based rate limiting (legacy).
+        Insert a measurement unless the database says the device is rate limited.
 
-        Calculates sun position, computes deltas, and saves to database.
+        The rate-limit check and the insert run in one database function call.
+        The in-process limiter is not consulted here (callers check it first).
 
         Args:
             request: Measurement request with device sensor data
+            geometry: Precomputed compute_measurement_geometry() result for
+                the request, or None to calculate it here
 
         Returns:
             The saved measurement record
@@ -110,12 +152,35 @@ class MeasurementService:
             RateLimitExceeded: If the device is rate limited
             MeasurementSaveFailed: If the database insert fails
         """
-        # Check rate limit first (legacy SQL-based check)
-        self.check_rate_limit(request.device_id)
-        return self.create_measurement_without_rate_check(request)
+        measurement_data = self._build_measurement_data(request, geometry)
+
+        # Rate-limit check and insert in a single round-trip
+        # (see create_measurement_if_allowed in scripts/create_tables.sql)
+        rpc_response = await self.supabase.rpc(
+            "create_measurement_if_allowed",
+            {
+                "measurement": measurement_data,
+                "window_seconds": self.RATE_LIMIT_SECONDS,
+            },
+        ).execute()
+
+        if not rpc_response.data:
+            raise MeasurementSaveFailed("Failed to save measurement to database")
+
+        result = rpc_response.data[0]
+        if result["status"] == 429:
+            wait_seconds = result["wait_seconds"]
+            self.rate_limiter.seed(
+                request.device_id, self.RATE_LIMIT_SECONDS - wait_seconds
+            )
+            raise RateLimitExceeded(wait_seconds)
+
+        return _row_to_response(result["measurement_row"])
 
-    def create_measurement_without_rate_check(
-        self, request: MeasurementRequest
+    async def create_measurement_without_rate_check(
+        self,
+        request: MeasurementRequest,
+        geometry: dict | None = None,
     ) -> MeasurementResponse:
         """
         Create a new measurement without rate limiting check.
@@ -124,6 +189,8 @@ class MeasurementService:
 
         Args:
             request: Measurement request with device sensor data
+            geometry: Precomputed compute_measurement_geometry() result for
+                the request, or None to calculate it here
 
         Returns:
             The saved measurement record
@@ -131,25 +198,40 @@ class MeasurementService:
         Raises:
             MeasurementSaveFailed: If the database insert fails
         """
-        # Calculate the actual sun position using Pysolar
-        sun_position = calculate_sun_position(
-            lat=request.latitude,
-            lon=request.longitude,
-            dt=request.timestamp,
+        measurement_data = self._build_measurement_data(request, geometry)
+
+        # Save to Supabase via REST API
+        insert_response = await (
+            self.supabase.table("measurements").insert(measurement_data).execute()
         )
 
+        if not insert_response.data:
+            raise MeasurementSaveFailed("Failed to save measurement to database")
+
+        return _row_to_response(insert_response.data[0])
+
+    def _build_measurement_data(
+        self,
+        request: MeasurementRequest,
+        geometry: dict | None = None,
+    ) -> dict:
+        """
+        Build the measurement record to insert.
+
+        Uses the precomputed compute_measurement_geometry() result, or
+        calculates it (sun position, sub-solar point, flat Earth height).
+        """
+        if geometry is None:
+            geometry = compute_measurement_geometry(
+                lat=request.latitude,
+                lon=request.longitude,
+                device_altitude=request.device_altitude,
+                dt=request.timestamp,
+            )
+
         # Calculate deltas (device reading - calculated position)
-        delta_azimuth = request.device_azimuth - sun_position["azimuth"]
-        delta_altitude = request.device_altitude - sun_position["altitude"]
-
-        # Calculate flat Earth sun height (triangulation test)
-        # Uses device_altitude (observed angle) and distance to sub-solar point
-        flat_earth_height = calculate_flat_earth_sun_height(
-            user_lat=request.latitude,
-            user_lon=request.longitude,
-            device_altitude=request.device_altitude,
-            dt=request.timestamp,
-        )
+        delta_azimuth = request.device_azimuth - geometry["azimuth"]
+        delta_altitude = request.device_altitude - geometry["altitude"]
 
         # Prepare measurement record
         measurement_data = {
@@ -161,57 +243,93 @@ class MeasurementService:
             "magnetic_azimuth": request.magnetic_azimuth,
             "magnetic_declination": request.magnetic_declination,
             "collection_method": request.collection_method,
-            "nasa_azimuth": sun_position["azimuth"],
-            "nasa_altitude": sun_position["altitude"],
+            "nasa_azimuth": geometry["azimuth"],
+            "nasa_altitude": geometry["altitude"],
             "delta_azimuth": delta_azimuth,
             "delta_altitude": delta_altitude,
-            "flat_earth_sun_height_km": flat_earth_height,
+            "flat_earth_sun_height_km": geometry["flat_earth_height"],
         }
 
-        # Save to Supabase via REST API
-        insert_response = (
-            self.supabase.table("measurements").insert(measurement_data).execute()
-        )
-
-        if not insert_response.data:
-            raise MeasurementSaveFailed("Failed to save measurement to database")
-
-        return _row_to_response(insert_response.data[0])
+        return measurement_data
 
-    def get_measurements_by_date(
+    async def get_measurement_rows_by_date(
         self,
         target_date: date | None = None,
         limit: int = 5000,
-    ) -> List[MeasurementResponse]:
+    ) -> List[dict]:
         """
-        Retrieve measurements for a specific date.
+        Retrieve raw measurement rows for a specific date.
 
         Args:
             target_date: Date to filter by (defaults to today if None)
             limit: Maximum number of measurements to return
 
         Returns:
-            List of measurements ordered by created_at descending
+            List of row dicts with the MeasurementResponse columns, ordered
+            by created_at descending
         """
         filter_date = target_date or date.today()
 
         # Calculate date range for the target day (start of day to end of day)
-        start_of_day = f"{filter_date}T00:00:00Z"
-        end_of_day = f"{filter_date}T23:59:59.999999Z"
+        start_of_day, end_of_day = day_range(filter_date)
 
-        response = (
-            self.supabase.table("measurements")
-            .select("*")
-            .gte("created_at", start_of_day)
-            .lte("created_at", end_of_day)
-            .order("created_at", desc=True)
-            .limit(limit)
-            .execute()
+        # Plan-cached SQL function (see get_measurements_in_range in
+        # scripts/create_tables.sql); returns the MeasurementResponse columns
+        response = await self.supabase.rpc(
+            "get_measurements_in_range",
+            {"start_ts": start_of_day, "end_ts": end_of_day, "max_rows": limit},
+        ).execute()
+
+        return response.data
+
+    async def get_measurements_json_by_date(
+        self,
+        target_date: date | None = None,
+        limit: int = 5000,
+    ) -> bytes:
+        """
+        Retrieve measurements for a specific date as a serialized JSON array.
+
+        Args:
+            target_date: Date to filter by (defaults to today if None)
+            limit: Maximum number of measurements to return
+
+        Returns:
+            JSON array of MeasurementResponse objects, ordered by created_at
+            descending
+        """
+        rows = await self.get_measurement_rows_by_date(target_date=target_date, limit=limit)
+        return _measurement_list_adapter.dump_json(
+            _measurement_list_adapter.validate_python(rows)
         )
 
-        return [_row_to_response(row) for row in response.data]
+    async def get_fingerprint_by_date(
+        self, target_date: date | None = None
+    ) -> tuple[int, str | None]:
+        """
+        Get a cheap fingerprint of a day's measurements for HTTP caching.
+
+        Args:
+            target_date: Date to fingerprint (defaults to today)
 
-    def get_stats_by_date(self, target_date: date | None = None) -> StatsResponse:
+        Returns:
+            Tuple of (row count, latest created_at or None)
+        """
+        filter_date = target_date or date.today()
+
+        start_of_day, end_of_day = day_range(filter_date)
+
+        # COUNT and MAX in one plan-cached aggregate
+        # (see measurement_fingerprint in scripts/create_tables.sql)
+        response = await self.supabase.rpc(
+            "measurement_fingerprint",
+            {"start_ts": start_of_day, "end_ts": end_of_day},
+        ).execute()
+
+        fingerprint = response.data[0] if response.data else {}
+        return fingerprint.get("count") or 0, fingerprint.get("latest")
+
+    async def get_stats_by_date(self, target_date: date | None = None) -> StatsResponse:
         """
         Calculate statistics for measurements on a specific date.
 
@@ -224,19 +342,16 @@ class MeasurementService:
         """
         filter_date = target_date or date.today()
 
-        start_of_day = f"{filter_date}T00:00:00Z"
-        end_of_day = f"{filter_date}T23:59:59.999999Z"
+        start_of_day, end_of_day = day_range(filter_date)
 
-        response = (
-            self.supabase.table("measurements")
-            .select("delta_azimuth, delta_altitude, flat_earth_sun_height_km")
-            .gte("created_at", start_of_day)
-            .lte("created_at", end_of_day)
-            .execute()
-        )
+        # Aggregated in Postgres: one row comes back regardless of volume
+        response = await self.supabase.rpc(
+            "measurement_stats",
+            {"start_ts": start_of_day, "end_ts": end_of_day},
+        ).execute()
 
-        rows = response.data
-        count = len(rows)
+        stats = response.data[0] if response.data else {}
+        count = stats.get("count") or 0
 
         if count == 0:
             return StatsResponse(
@@ -250,39 +365,25 @@ class MeasurementService:
                 std_dev_flat_earth_sun_height_km=None,
             )
 
-        delta_azimuths = [row["delta_azimuth"] for row in rows]
-        delta_altitudes = [row["delta_altitude"] for row in rows]
-
-        avg_az = statistics.mean(delta_azimuths)
-        avg_alt = statistics.mean(delta_altitudes)
-
-        # Standard deviation requires at least 2 data points
-        std_az = statistics.stdev(delta_azimuths) if count >= 2 else 0.0
-        std_alt = statistics.stdev(delta_altitudes) if count >= 2 else 0.0
+        # Sample standard deviation is NULL below 2 data points; report 0
+        std_az = stats["std_dev_azimuth"] or 0.0
+        std_alt = stats["std_dev_altitude"] or 0.0
 
         # Flat Earth triangulation statistics
-        # Filter out None values (measurements where altitude was too low)
-        flat_earth_heights = [
-            row["flat_earth_sun_height_km"]
-            for row in rows
-            if row.get("flat_earth_sun_height_km") is not None
-        ]
-        flat_earth_count = len(flat_earth_heights)
+        # NULL heights (altitude too low when measured) are ignored by SQL aggregates
+        flat_earth_count = stats.get("flat_earth_samples") or 0
 
         avg_flat_earth = None
         std_flat_earth = None
 
         if flat_earth_count > 0:
-            avg_flat_earth = round(statistics.mean(flat_earth_heights), 2)
-            if flat_earth_count >= 2:
-                std_flat_earth = round(statistics.stdev(flat_earth_heights), 2)
-            else:
-                std_flat_earth = 0.0
+            avg_flat_earth = round(stats["avg_flat_earth_sun_height_km"], 2)
+            std_flat_earth = round(stats["std_dev_flat_earth_sun_height_km"] or 0.0, 2)
 
         return StatsResponse(
             count=count,
-            avg_delta_azimuth=round(avg_az, 4),
-            avg_delta_altitude=round(avg_alt, 4),
+            avg_delta_azimuth=round(stats["avg_delta_azimuth"], 4),
+            avg_delta_altitude=round(stats["avg_delta_altitude"], 4),
             std_dev_azimuth=round(std_az, 4),
             std_dev_altitude=round(std_alt, 4),
             flat_earth_samples=flat_earth_count if flat_earth_count > 0 else None,
@@ -290,58 +391,65 @@ class MeasurementService:
             std_dev_flat_earth_sun_height_km=std_flat_earth,
         )
 
-    def export_csv_by_date(self, target_date: date | None = None) -> str:
+    async def iter_csv_by_date(
+        self, target_date: date | None = None
+    ) -> AsyncIterator[bytes]:
         """
-        Export measurements as CSV string.
+        Stream measurements as CSV, one chunk per page of rows.
+
+        Pages are fetched with keyset pagination on (created_at, id), newest
+        first like /measurements, so memory use is bounded by the page size
+        and the first chunk is sent as soon as the first page arrives.
 
         Args:
             target_date: Date to export (defaults to today)
 
-        Returns:
-            CSV formatted string of measurements
+        Yields:
+            UTF-8 encoded CSV chunks, starting with the header row
         """
-        measurements = self.get_measurements_by_date(target_date=target_date, limit=10000)
+        filter_date = target_date or date.today()
+
+        start_of_day, end_of_day = day_range(filter_date)
 
         output = io.StringIO()
         writer = csv.writer(output)
 
         # Header row
-        writer.writerow([
-            "id",
-            "created_at",
-            "device_id",
-            "latitude",
-            "longitude",
-            "device_azimuth",
-            "device_altitude",
-            "magnetic_azimuth",
-            "magnetic_declination",
-            "collection_method",
-            "nasa_azimuth",
-            "nasa_altitude",
-            "delta_azimuth",
-            "delta_altitude",
-            "flat_earth_sun_height_km",
-        ])
-
-        # Data rows
-        for m in measurements:
-            writer.writerow([
-                m.id,
-                m.created_at,
-                m.device_id or "",
-                m.latitude,
-                m.longitude,
-                m.device_azimuth,
-                m.device_altitude,
-                m.magnetic_azimuth if m.magnetic_azimuth is not None else "",
-                m.magnetic_declination if m.magnetic_declination is not None else "",
-                m.collection_method or "",
-                m.nasa_azimuth,
-                m.nasa_altitude,
-                m.delta_azimuth,
-                m.delta_altitude,
-                m.flat_earth_sun_height_km if m.flat_earth_sun_height_km is not None else "",
-            ])
-
-        return output.getvalue()
+        writer.writerow(_MEASUREMENT_COLUMNS)
+
+        last_row = None
+        while True:
+            query = (
+                self.supabase.table("measurements")
+                .select(_MEASUREMENT_SELECT)
+                .gte("created_at", start_of_day)
+                .lte("created_at", end_of_day)
+            )
+            if last_row is not None:
+                # Rows strictly after the previous page's last (created_at, id)
+                last_created_at = last_row["created_at"]
+                query = query.or_(
+                    f'created_at.lt."{last_created_at}",'
+                    f'and(created_at.eq."{last_created_at}",id.lt.{last_row["id"]})'
+                )
+
+            response = await (
+                query.order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(self.EXPORT_PAGE_SIZE)
+                .execute()
+            )
+            rows = response.data
+
+            # Data rows, written straight from the row dicts in one writerows
+            # call (every selected column is present; csv writes None as an
+            # empty field)
+            writer.writerows(map(_measurement_values, rows))
+
+            yield output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate(0)
+
+            if len(rows) < self.EXPORT_PAGE_SIZE:
+                break
+            last_row = rows[-1]
@@ -1,12 +1,14 @@
 """Verdict Engine service layer for Earth model analysis."""
 
-from datetime import date, datetime, timedelta, timezone
-from typing import List, Optional
-
-from supabase import Client
+from datetime import date
+from typing import TYPE_CHECKING, Optional
 
+from app.core.dates import day_range, now_utc
 from app.schemas.verdict import VerdictResponse
 
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
 
 # Constants
 OUTLIER_THRESHOLD = 20.0  # degrees - ignore measurements with |delta| > this
@@ -15,17 +17,14 @@ ANALYSIS_WINDOW_HOURS = 24
 
 
 def _row_to_response(row: dict) -> VerdictResponse:
-    """Convert a database row to a VerdictResponse."""
-    return VerdictResponse(
-        id=row["id"],
-        created_at=row["created_at"],
-        total_samples=row["total_samples"],
-        valid_samples=row["valid_samples"],
-        avg_error_azimuth=row["avg_error_azimuth"],
-        avg_error_altitude=row["avg_error_altitude"],
-        confidence_score=row["confidence_score"],
-        winning_model=row["winning_model"],
-    )
+    """
+    Convert a database row to a VerdictResponse.
+
+    Column types are enforced by the table, so the model is built without
+    re-running validation (columns outside the model, such as verdict_date,
+    are ignored).
+    """
+    return VerdictResponse.model_construct(**row)
 
 
 class VerdictService:
@@ -36,12 +35,18 @@ class VerdictService:
     match NASA/Pysolar calculations (Earth model validation).
     """
 
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: "AsyncClient"):
         self.supabase = supabase
 
-    def calculate_score(self, measurements: List[dict]) -> dict:
+    def score_from_aggregates(
+        self,
+        total_samples: int,
+        valid_samples: int,
+        avg_error_az: float,
+        avg_error_alt: float,
+    ) -> dict:
         """
-        Calculate verdict score from measurements.
+        Calculate verdict score from already-aggregated errors.
 
         Algorithm:
         1. Filter outliers (|delta| > 20°) - assumed user error
@@ -49,32 +54,18 @@ class VerdictService:
         3. Score = 100 - (avg_az + avg_alt), clamped 0-100
         4. Winner: score > 85 => NASA, else ANOMALY
 
+        Steps 1-2 run in Postgres (compute_verdict_aggregates in
+        scripts/create_tables.sql); this applies steps 3-4 to their output.
+
         Args:
-            measurements: List of measurement dicts with delta_azimuth, delta_altitude
+            total_samples: Number of measurements analyzed
+            valid_samples: Measurements left after outlier filtering
+            avg_error_az: Mean absolute azimuth error of valid samples
+            avg_error_alt: Mean absolute altitude error of valid samples
 
         Returns:
             Dict with verdict calculation results
         """
-        total_samples = len(measurements)
-
-        if total_samples == 0:
-            return {
-                "total_samples": 0,
-                "valid_samples": 0,
-                "avg_error_azimuth": 0.0,
-                "avg_error_altitude": 0.0,
-                "confidence_score": 0.0,
-                "winning_model": "ANOMALY",
-            }
-
-        # Filter outliers (|delta| > 20 degrees = user error)
-        valid = [
-            m for m in measurements
-            if abs(m["delta_azimuth"]) <= OUTLIER_THRESHOLD
-            and abs(m["delta_altitude"]) <= OUTLIER_THRESHOLD
-        ]
-        valid_samples = len(valid)
-
         if valid_samples == 0:
             return {
                 "total_samples": total_samples,
@@ -85,10 +76,6 @@ class VerdictService:
                 "winning_model": "ANOMALY",
             }
 
-        # Calculate mean absolute error
-        avg_error_az = sum(abs(m["delta_azimuth"]) for m in valid) / valid_samples
-        avg_error_alt = sum(abs(m["delta_altitude"]) for m in valid) / valid_samples
-
         # Score: 100 - total error, clamped 0-100
         raw_score = 100 - (avg_error_az + avg_error_alt)
         confidence_score = max(0.0, min(100.0, raw_score))
@@ -105,7 +92,7 @@ class VerdictService:
             "winning_model": winning_model,
         }
 
-    def trigger_calculation(self, target_date: Optional[date] = None) -> VerdictResponse:
+    async def trigger_calculation(self, target_date: Optional[date] = None) -> VerdictResponse:
         """
         Trigger verdict calculation for a specific date or last 24 hours.
 
@@ -118,41 +105,44 @@ class VerdictService:
         """
         if target_date is not None:
             # Specific date: full day range
-            start_of_day = f"{target_date}T00:00:00Z"
-            end_of_day = f"{target_date}T23:59:59.999999Z"
-
-            response = (
-                self.supabase.table("measurements")
-                .select("delta_azimuth, delta_altitude")
-                .gte("created_at", start_of_day)
-                .lte("created_at", end_of_day)
-                .execute()
-            )
+            start_ts, end_ts = day_range(target_date)
         else:
-            # Default: last 24 hours
-            cutoff = datetime.now(timezone.utc) - timedelta(hours=ANALYSIS_WINDOW_HOURS)
-            cutoff_iso = cutoff.isoformat()
-
-            response = (
-                self.supabase.table("measurements")
-                .select("delta_azimuth, delta_altitude")
-                .gte("created_at", cutoff_iso)
-                .execute()
-            )
-
-        measurements = response.data or []
+            # Default: last 24 hours, with the cutoff computed by Postgres
+            # (now() - window_hours) rather than formatted in Python
+            start_ts = None
+            end_ts = None
+
+        # Outlier filtering and averaging run in Postgres, so only the four
+        # aggregates come back instead of every measurement row
+        # (see compute_verdict_aggregates in scripts/create_tables.sql)
+        response = await self.supabase.rpc(
+            "compute_verdict_aggregates",
+            {
+                "start_ts": start_ts,
+                "end_ts": end_ts,
+                "outlier_threshold": OUTLIER_THRESHOLD,
+                "window_hours": ANALYSIS_WINDOW_HOURS,
+            },
+        ).execute()
+
+        aggregates = response.data[0] if response.data else {}
 
         # Calculate score
-        result = self.calculate_score(measurements)
+        result = self.score_from_aggregates(
+            total_samples=aggregates.get("total_samples") or 0,
+            valid_samples=aggregates.get("valid_samples") or 0,
+            avg_error_az=aggregates.get("avg_error_azimuth") or 0.0,
+            avg_error_alt=aggregates.get("avg_error_altitude") or 0.0,
+        )
 
-        # Determine the date for this verdict (for idempotency check)
+        # Determine the date for this verdict (one verdict per date)
         verdict_date = target_date or date.today()
 
-        # Idempotency: check if verdict already exists for this date
-        existing = self._get_verdict_for_date(verdict_date)
-
-        # Prepare verdict record
+        # Prepare verdict record. created_at is refreshed on recalculation so
+        # the verdict sorts as latest and its ETag changes.
         verdict_data = {
+            "verdict_date": verdict_date.isoformat(),
+            "created_at": now_utc().isoformat(),
             "total_samples": result["total_samples"],
             "valid_samples": result["valid_samples"],
             "avg_error_azimuth": result["avg_error_azimuth"],
@@ -161,21 +151,20 @@ class VerdictService:
             "winning_model": result["winning_model"],
         }
 
-        if existing is not None:
-            # Update existing verdict (delete + insert for simplicity with Supabase)
-            self.supabase.table("verdicts").delete().eq("id", existing.id).execute()
-
-        # Insert new verdict
-        insert_response = (
-            self.supabase.table("verdicts").insert(verdict_data).execute()
+        # Idempotency: insert, or replace the existing verdict for this date,
+        # in one round-trip (unique index on verdict_date)
+        upsert_response = await (
+            self.supabase.table("verdicts")
+            .upsert(verdict_data, on_conflict="verdict_date")
+            .execute()
         )
 
-        if not insert_response.data:
+        if not upsert_response.data:
             raise RuntimeError("Failed to save verdict to database")
 
-        return _row_to_response(insert_response.data[0])
+        return _row_to_response(upsert_response.data[0])
 
-    def _get_verdict_for_date(self, target_date: date) -> Optional[VerdictResponse]:
+    async def _get_verdict_for_date(self, target_date: date) -> Optional[VerdictResponse]:
         """
         Get verdict for a specific calendar date.
 
@@ -185,25 +174,21 @@ class VerdictService:
         Returns:
             Verdict for that date, or None if not found
         """
-        start_of_day = f"{target_date}T00:00:00Z"
-        end_of_day = f"{target_date}T23:59:59.999999Z"
-
-        response = (
+        response = await (
             self.supabase.table("verdicts")
             .select("*")
-            .gte("created_at", start_of_day)
-            .lte("created_at", end_of_day)
-            .order("created_at", desc=True)
-            .limit(1)
+            .eq("verdict_date", target_date.isoformat())
+            .maybe_single()
             .execute()
         )
 
-        if not response.data:
+        # No row: the client returns None instead of a response
+        if response is None or not response.data:
             return None
 
-        return _row_to_response(response.data[0])
+        return _row_to_response(response.data)
 
-    def get_latest(self, target_date: Optional[date] = None) -> Optional[VerdictResponse]:
+    async def get_latest(self, target_date: Optional[date] = None) -> Optional[VerdictResponse]:
         """
         Get the most recent verdict, optionally filtered by date.
 
@@ -215,18 +200,19 @@ class VerdictService:
             The verdict, or None if not found
         """
         if target_date is not None:
-            return self._get_verdict_for_date(target_date)
+            return await self._get_verdict_for_date(target_date)
 
         # Default: get latest overall
-        response = (
+        response = await (
             self.supabase.table("verdicts")
             .select("*")
             .order("created_at", desc=True)
             .limit(1)
+            .maybe_single()
             .execute()
         )
 
-        if not response.data:
+        if response is None or not response.data:
             return None
 
-        return _row_to_response(response.data[0])
+        return _row_to_response(response.data)
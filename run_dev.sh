@@ -4,9 +4,9 @@
 source venv/bin/activate 2>/dev/null || {
     echo "Could not activate venv automatically."
     echo "Run: source venv/bin/activate"
-    echo "Then: uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
+    echo "Then: uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 --proxy-headers --forwarded-allow-ips 127.0.0.1"
     exit 1
 }
 
 # Run development server
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
+uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 --proxy-headers --forwarded-allow-ips 127.0.0.1
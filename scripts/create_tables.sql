@@ -9,25 +9,301 @@ CREATE TABLE IF NOT EXISTS measurements (
     -- Anonymous device identifier for rate limiting
     device_id VARCHAR(255),
 
+    -- Angles and coordinates are stored as REAL (4 bytes, ~7 significant
+    -- digits): ~1 m at the equator and ~1e-5 degrees, far below sensor
+    -- precision, at half the size of DOUBLE PRECISION
+
     -- Location where measurement was taken
-    latitude DOUBLE PRECISION NOT NULL,
-    longitude DOUBLE PRECISION NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
 
     -- Device sensor readings (what the user measured)
-    device_azimuth DOUBLE PRECISION NOT NULL,
-    device_altitude DOUBLE PRECISION NOT NULL,
+    device_azimuth REAL NOT NULL,
+    device_altitude REAL NOT NULL,
 
     -- Calculated sun position (from Pysolar)
-    nasa_azimuth DOUBLE PRECISION NOT NULL,
-    nasa_altitude DOUBLE PRECISION NOT NULL,
+    nasa_azimuth REAL NOT NULL,
+    nasa_altitude REAL NOT NULL,
 
     -- Delta between device and calculated values
-    delta_azimuth DOUBLE PRECISION NOT NULL,
-    delta_altitude DOUBLE PRECISION NOT NULL
+    delta_azimuth REAL NOT NULL,
+    delta_altitude REAL NOT NULL
+);
+
+-- Existing tables: narrow the columns above from DOUBLE PRECISION to REAL.
+-- One statement so the table (and its indexes) is rewritten only once; it
+-- takes an exclusive lock for the duration, so run it in a quiet period.
+-- Skipped (no lock taken) once the columns are already REAL.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'measurements'
+          AND column_name IN (
+              'latitude', 'longitude',
+              'device_azimuth', 'device_altitude',
+              'nasa_azimuth', 'nasa_altitude',
+              'delta_azimuth', 'delta_altitude'
+          )
+          AND data_type = 'double precision'
+    ) THEN
+        ALTER TABLE measurements
+            ALTER COLUMN latitude TYPE REAL,
+            ALTER COLUMN longitude TYPE REAL,
+            ALTER COLUMN device_azimuth TYPE REAL,
+            ALTER COLUMN device_altitude TYPE REAL,
+            ALTER COLUMN nasa_azimuth TYPE REAL,
+            ALTER COLUMN nasa_altitude TYPE REAL,
+            ALTER COLUMN delta_azimuth TYPE REAL,
+            ALTER COLUMN delta_altitude TYPE REAL;
+    END IF;
+END
+$$;
+
+-- Columns added after the initial schema
+ALTER TABLE measurements ADD COLUMN IF NOT EXISTS magnetic_azimuth DOUBLE PRECISION;
+ALTER TABLE measurements ADD COLUMN IF NOT EXISTS magnetic_declination DOUBLE PRECISION;
+ALTER TABLE measurements ADD COLUMN IF NOT EXISTS collection_method VARCHAR(16);
+ALTER TABLE measurements ADD COLUMN IF NOT EXISTS flat_earth_sun_height_km DOUBLE PRECISION;
+
+-- Note: on a large live table, run the CREATE INDEX statements below one at a
+-- time with CONCURRENTLY to avoid locking writes (CONCURRENTLY cannot run
+-- inside the implicit transaction of a multi-statement script).
+
+-- Rate limiting: "latest measurement for device" becomes a single index descent.
+-- Its leading device_id column also serves plain device_id lookups, so the
+-- former single-column index is redundant and only slows down inserts.
+CREATE INDEX IF NOT EXISTS idx_measurements_device_created
+    ON measurements(device_id, created_at DESC);
+DROP INDEX IF EXISTS idx_measurements_device_id;
+
+-- Index on created_at for time-based queries. It also covers /stats: the
+-- included columns are read from the index without visiting the heap. It
+-- replaces the former plain created_at index, which had the same key and
+-- only added a second btree to maintain on every insert.
+CREATE INDEX IF NOT EXISTS idx_measurements_created_at_stats
+    ON measurements(created_at DESC)
+    INCLUDE (delta_azimuth, delta_altitude, flat_earth_sun_height_km);
+DROP INDEX IF EXISTS idx_measurements_created_at;
+
+-- Rate-limited insert: checks the device's latest measurement and inserts
+-- the new one in a single round-trip.
+-- Returns status 429 with wait_seconds if the device is inside the window,
+-- otherwise status 201 with the inserted row as measurement_row.
+CREATE OR REPLACE FUNCTION create_measurement_if_allowed(
+    measurement JSONB,
+    window_seconds INTEGER DEFAULT 10
+)
+RETURNS TABLE (status INTEGER, wait_seconds INTEGER, measurement_row JSONB)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    last_created_at TIMESTAMPTZ;
+    inserted measurements;
+BEGIN
+    -- Serialize concurrent submissions from the same device
+    PERFORM pg_advisory_xact_lock(hashtext(measurement->>'device_id'));
+
+    -- Latest measurement for the device: a single descent of
+    -- idx_measurements_device_created (device_id, created_at DESC), so the
+    -- check stays constant-time as the table grows
+    SELECT m.created_at INTO last_created_at
+    FROM measurements m
+    WHERE m.device_id = measurement->>'device_id'
+    ORDER BY m.created_at DESC
+    LIMIT 1;
+
+    IF last_created_at IS NOT NULL
+       AND last_created_at > NOW() - make_interval(secs => window_seconds) THEN
+        RETURN QUERY SELECT
+            429,
+            CEIL(window_seconds - EXTRACT(EPOCH FROM NOW() - last_created_at))::INTEGER,
+            NULL::JSONB;
+        RETURN;
+    END IF;
+
+    INSERT INTO measurements (
+        device_id, latitude, longitude,
+        device_azimuth, device_altitude,
+        magnetic_azimuth, magnetic_declination, collection_method,
+        nasa_azimuth, nasa_altitude,
+        delta_azimuth, delta_altitude,
+        flat_earth_sun_height_km
+    )
+    SELECT
+        r.device_id, r.latitude, r.longitude,
+        r.device_azimuth, r.device_altitude,
+        r.magnetic_azimuth, r.magnetic_declination, r.collection_method,
+        r.nasa_azimuth, r.nasa_altitude,
+        r.delta_azimuth, r.delta_altitude,
+        r.flat_earth_sun_height_km
+    FROM jsonb_populate_record(NULL::measurements, measurement) AS r
+    RETURNING * INTO inserted;
+
+    RETURN QUERY SELECT 201, 0, to_jsonb(inserted);
+END;
+$$;
+
+-- Verdict aggregates: outlier filtering and mean absolute errors computed
+-- in the database, so the Verdict Engine receives four numbers instead of
+-- every measurement row.
+-- start_ts NULL means "the last window_hours hours" (cutoff computed by
+-- Postgres); end_ts NULL means "up to now".
+DROP FUNCTION IF EXISTS compute_verdict_aggregates(TIMESTAMPTZ, TIMESTAMPTZ, DOUBLE PRECISION);
+
+CREATE OR REPLACE FUNCTION compute_verdict_aggregates(
+    start_ts TIMESTAMPTZ DEFAULT NULL,
+    end_ts TIMESTAMPTZ DEFAULT NULL,
+    outlier_threshold DOUBLE PRECISION DEFAULT 20,
+    window_hours INTEGER DEFAULT 24
+)
+RETURNS TABLE (
+    total_samples BIGINT,
+    valid_samples BIGINT,
+    avg_error_azimuth DOUBLE PRECISION,
+    avg_error_altitude DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE is_valid),
+        AVG(abs_azimuth) FILTER (WHERE is_valid),
+        AVG(abs_altitude) FILTER (WHERE is_valid)
+    FROM (
+        SELECT
+            ABS(delta_azimuth) AS abs_azimuth,
+            ABS(delta_altitude) AS abs_altitude,
+            ABS(delta_azimuth) <= outlier_threshold
+                AND ABS(delta_altitude) <= outlier_threshold AS is_valid
+        FROM measurements
+        WHERE created_at >= COALESCE(start_ts, NOW() - make_interval(hours => window_hours))
+          AND (end_ts IS NULL OR created_at <= end_ts)
+    ) AS m;
+$$;
+
+-- Day-range statistics for /stats: one aggregate row instead of every
+-- measurement. STDDEV_SAMP is NULL below two samples; the API maps that to 0.
+CREATE OR REPLACE FUNCTION measurement_stats(
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ
+)
+RETURNS TABLE (
+    count BIGINT,
+    avg_delta_azimuth DOUBLE PRECISION,
+    avg_delta_altitude DOUBLE PRECISION,
+    std_dev_azimuth DOUBLE PRECISION,
+    std_dev_altitude DOUBLE PRECISION,
+    flat_earth_samples BIGINT,
+    avg_flat_earth_sun_height_km DOUBLE PRECISION,
+    std_dev_flat_earth_sun_height_km DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        AVG(delta_azimuth),
+        AVG(delta_altitude),
+        STDDEV_SAMP(delta_azimuth),
+        STDDEV_SAMP(delta_altitude),
+        COUNT(flat_earth_sun_height_km),
+        AVG(flat_earth_sun_height_km),
+        STDDEV_SAMP(flat_earth_sun_height_km)
+    FROM measurements
+    WHERE created_at >= start_ts
+      AND created_at <= end_ts;
+$$;
+
+-- Verdicts table: one Verdict Engine result per calendar day
+CREATE TABLE IF NOT EXISTS verdicts (
+    id SERIAL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    total_samples INTEGER NOT NULL,
+    valid_samples INTEGER NOT NULL,
+    avg_error_azimuth DOUBLE PRECISION NOT NULL,
+    avg_error_altitude DOUBLE PRECISION NOT NULL,
+    confidence_score DOUBLE PRECISION NOT NULL,
+    winning_model VARCHAR(16) NOT NULL
 );
 
--- Index on device_id for efficient rate limiting queries
-CREATE INDEX IF NOT EXISTS idx_measurements_device_id ON measurements(device_id);
+-- The day a verdict covers. Unique, so a recalculation is a single upsert
+-- (ON CONFLICT (verdict_date)) instead of select + delete + insert.
+ALTER TABLE verdicts ADD COLUMN IF NOT EXISTS verdict_date DATE;
+
+-- Backfill rows written before the column existed, keeping only the newest
+-- verdict per day (older ones were replaced by recalculation anyway)
+UPDATE verdicts SET verdict_date = (created_at AT TIME ZONE 'UTC')::DATE
+WHERE verdict_date IS NULL;
+DELETE FROM verdicts older
+USING verdicts newer
+WHERE older.verdict_date = newer.verdict_date
+  AND older.created_at < newer.created_at;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_verdicts_verdict_date ON verdicts(verdict_date);
+
+-- Hot read paths as stable SQL functions: fixed parameter signatures let
+-- Postgres reuse their plans instead of re-planning a PostgREST filter chain
+-- on every request. Both are served by idx_measurements_created_at_stats.
+
+-- A day's measurements, newest first (GET /measurements). Returns exactly
+-- the MeasurementResponse columns, so columns added to the table later are
+-- not exposed by the API. Changing the return type needs a DROP first.
+DROP FUNCTION IF EXISTS get_measurements_in_range(TIMESTAMPTZ, TIMESTAMPTZ, INTEGER);
+CREATE OR REPLACE FUNCTION get_measurements_in_range(
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ,
+    max_rows INTEGER DEFAULT 5000
+)
+RETURNS TABLE (
+    id INTEGER,
+    created_at TIMESTAMPTZ,
+    device_id VARCHAR,
+    latitude REAL,
+    longitude REAL,
+    device_azimuth REAL,
+    device_altitude REAL,
+    magnetic_azimuth DOUBLE PRECISION,
+    magnetic_declination DOUBLE PRECISION,
+    collection_method VARCHAR,
+    nasa_azimuth REAL,
+    nasa_altitude REAL,
+    delta_azimuth REAL,
+    delta_altitude REAL,
+    flat_earth_sun_height_km DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        m.id, m.created_at, m.device_id,
+        m.latitude, m.longitude,
+        m.device_azimuth, m.device_altitude,
+        m.magnetic_azimuth, m.magnetic_declination, m.collection_method,
+        m.nasa_azimuth, m.nasa_altitude,
+        m.delta_azimuth, m.delta_altitude,
+        m.flat_earth_sun_height_km
+    FROM measurements m
+    WHERE m.created_at >= start_ts
+      AND m.created_at <= end_ts
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT max_rows;
+$$;
 
--- Index on created_at for time-based queries
-CREATE INDEX IF NOT EXISTS idx_measurements_created_at ON measurements(created_at DESC);
+-- Cheap change detector for HTTP caching (ETag of /measurements and /stats)
+CREATE OR REPLACE FUNCTION measurement_fingerprint(
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ
+)
+RETURNS TABLE (count BIGINT, latest TIMESTAMPTZ)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COUNT(*), MAX(created_at)
+    FROM measurements
+    WHERE created_at >= start_ts
+      AND created_at <= end_ts;
+$$;